@@ -1,4 +1,14 @@
 """https://adventofcode.com/2022/day/1"""
+import heapq
+import itertools
+import mmap
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+# A line ending followed by a line holding nothing but whitespace
+_BLANK_LINE = re.compile(rb'\r?\n[ \t\r]*\n')
+
 
 def parse_loads(stream):
     """
@@ -30,15 +40,147 @@ def parse_loads(stream):
     return loads
 
 
+def load_sums(stream):
+    """
+    Same grouping as parse_loads, but only the running total is kept.
+
+    >>> intext = ['1000', '2000', '', '4000', '', '5000', '6000']
+    >>> list(load_sums(intext))
+    [3000, 4000, 11000]
+    """
+    total = 0
+    in_load = False
+    for line in stream:
+        line = line.strip()
+        if line == '':
+            yield total
+            total = 0
+            in_load = False
+        else:
+            total += int(line)
+            in_load = True
+    if in_load:
+        yield total
+
+
+def read_load_sums(infile, chunk_size=1 << 20):
+    """
+    Read a binary file in large chunks and yield the total of each load.
+
+    Runs of blank lines count as a single separator, whatever the line
+    endings.
+
+    >>> import io
+    >>> raw = io.BytesIO(b'1000\\n2000\\n\\n4000\\n\\n\\n5000\\n6000\\n')
+    >>> list(read_load_sums(raw, chunk_size=7))
+    [3000, 4000, 11000]
+    >>> raw = io.BytesIO(b'1000\\r\\n2000\\r\\n\\r\\n4000\\r\\n \\r\\n5000\\r\\n')
+    >>> list(read_load_sums(raw, chunk_size=3))
+    [3000, 4000, 5000]
+    """
+    return _window_load_sums(iter(lambda: infile.read(chunk_size), b''))
+
+
+def _window_load_sums(windows):
+    leftover = b''
+    for window in windows:
+        groups = _BLANK_LINE.split(leftover + window)
+        # The last group may carry on into the next window
+        leftover = groups.pop()
+        yield from _group_sums(groups)
+    yield from _group_sums([leftover])
+
+
+def _group_sums(groups):
+    for group in groups:
+        # int() accepts bytes and ignores surrounding whitespace
+        numbers = group.split()
+        if numbers:
+            yield sum(map(int, numbers))
+
+
+def top_loads(totals, k=3):
+    """
+    Largest k totals, biggest first, keeping only k values in memory.
+
+    >>> top_loads([6000, 4000, 11000, 24000, 10000])
+    [24000, 11000, 10000]
+    >>> top_loads([5, 1], k=3)
+    [5, 1]
+    >>> top_loads([5, 1], k=0)
+    []
+    """
+    if k <= 0:
+        return []
+    heap = []
+    for total in totals:
+        if len(heap) < k:
+            heapq.heappush(heap, total)
+        elif total > heap[0]:
+            heapq.heapreplace(heap, total)
+    return sorted(heap, reverse=True)
+
+
+def _split_points(mapped, n_parts):
+    """Offsets that cut the mapped file only just after blank lines."""
+    size = len(mapped)
+    points = [0]
+    for ii in range(1, n_parts):
+        start = max(points[-1], size * ii // n_parts)
+        blank = _BLANK_LINE.search(mapped, start)
+        if blank is None:
+            break
+        points.append(blank.end())
+    points.append(size)
+    return points
+
+
+def _range_top_loads(path, start, end, k, window=1 << 20):
+    with open(path, 'rb') as infile:
+        with mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            # Only one window of the range is copied out at a time
+            windows = (
+                mapped[pos:min(pos + window, end)]
+                for pos in range(start, end, window)
+            )
+            return top_loads(_window_load_sums(windows), k)
+
+
+def parallel_top_loads(path, k=3, workers=None):
+    """
+    Split a calorie file at blank lines and find the top k across processes.
+
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as tmp:
+    ...     path = os.path.join(tmp, 'loads.txt')
+    ...     with open(path, 'w') as outfile:
+    ...         _ = outfile.write('1000\\n2000\\n3000\\n\\n4000\\n\\n5000\\n6000\\n\\n'
+    ...                           '7000\\n8000\\n9000\\n\\n10000\\n')
+    ...     parallel_top_loads(path, k=3, workers=3)
+    [24000, 11000, 10000]
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    with open(path, 'rb') as infile:
+        if os.fstat(infile.fileno()).st_size == 0:
+            return []
+        with mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            points = _split_points(mapped, workers)
+    ranges = [(a, b) for a, b in zip(points[:-1], points[1:]) if a < b]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(_range_top_loads, path, start, end, k)
+            for start, end in ranges
+        ]
+        local_tops = [fut.result() for fut in futures]
+    return top_loads(itertools.chain.from_iterable(local_tops), k)
+
+
 if __name__ == '__main__':
     import doctest
     doctest.testmod()
 
-    with open('day01.txt') as infile:
-        elf_loads = parse_loads(infile)
-    total_loads = [sum(load) for load in elf_loads]
-    max_load = max(total_loads)
-    print(max_load)
-
-    total_loads.sort()
-    print(sum(total_loads[-3:]))
+    with open('day01.txt', 'rb') as infile:
+        biggest = top_loads(read_load_sums(infile), k=3)
+    print(biggest[0])
+    print(sum(biggest))
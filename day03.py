@@ -2,6 +2,8 @@
 
 from functools import reduce
 
+import numpy as np
+
 
 def find_repeats(sacks):
     repeated = []
@@ -59,6 +61,218 @@ def sum_trio_badges(sacks):
     return total_priority(badges)
 
 
+_ITEM_ORDER = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+# Bit n of an item's mask is set for an item of priority n
+ITEM_BITS = [
+    1 << (_ITEM_ORDER.index(chr(byte)) + 1) if chr(byte) in _ITEM_ORDER else 0
+    for byte in range(256)
+]
+
+
+# Same table as ITEM_BITS, for indexing whole byte arrays
+ITEM_BIT_TABLE = np.array(ITEM_BITS, dtype=np.uint64)
+
+
+def mask_priority(mask: int) -> int:
+    """Priority of the single item in a mask"""
+    return mask.bit_length() - 1
+
+
+def shared_items(first: bytes, second: bytes) -> bytes:
+    """
+    Bytes of ``first`` that also occur in ``second``
+
+    Deleting everything ``second`` lacks keeps the whole scan in C.
+
+    >>> shared_items(b'vJrwpWtwJgWr', b'hcsFMMfFFhFp')
+    b'p'
+    """
+    return first.translate(None, first.translate(None, second))
+
+
+def sum_repeat_priority_bits(sacks):
+    """
+    >>> rs = [
+    ...     'vJrwpWtwJgWrhcsFMMfFFhFp',
+    ...     'jqHRNqRjqzjGDLGLrsFMfFZSrLrFZsSL',
+    ...     'PmmdzqPrVvPwwTWBwg',
+    ...     'wMqvLMZHhHMvwLHjbvcjnnSBnvTQFn',
+    ...     'ttgJtRGJQctTZtZT',
+    ...     'CrZsJsPPZsGzwwsLwLmpwMDw',
+    ... ]
+    >>> sum_repeat_priority_bits(rs)
+    157
+    >>> sum_repeat_priority_bits(['abab'])
+    3
+    """
+    bits = ITEM_BITS
+    total = 0
+    for sack in map(str.encode, sacks):
+        halfway = len(sack) // 2
+        common = shared_items(sack[:halfway], sack[halfway:])
+        if not common:
+            continue
+        if common.count(common[0]) == len(common):
+            total += mask_priority(bits[common[0]])
+            continue
+        # Like find_repeats, every shared item type counts once
+        mask = 0
+        for byte in common:
+            mask |= bits[byte]
+        while mask:
+            low = mask & -mask
+            total += mask_priority(low)
+            mask ^= low
+    return total
+
+
+def sum_trio_badges_bits(sacks):
+    """
+    >>> rs = [
+    ...     'vJrwpWtwJgWrhcsFMMfFFhFp',
+    ...     'jqHRNqRjqzjGDLGLrsFMfFZSrLrFZsSL',
+    ...     'PmmdzqPrVvPwwTWBwg',
+    ...     'wMqvLMZHhHMvwLHjbvcjnnSBnvTQFn',
+    ...     'ttgJtRGJQctTZtZT',
+    ...     'CrZsJsPPZsGzwwsLwLmpwMDw',
+    ... ]
+    >>> sum_trio_badges_bits(rs)
+    70
+    """
+    bits = ITEM_BITS
+    total = 0
+    sack_iter = iter(map(str.encode, sacks))
+    for first, second, third in zip(sack_iter, sack_iter, sack_iter):
+        common = shared_items(shared_items(first, second), third)
+        assert common and common.count(common[0]) == len(common)
+        total += mask_priority(bits[common[0]])
+    return total
+
+
+def benchmark_priorities(n_sacks=120000, repeat=1):
+    """Best-of-``repeat`` seconds for the set, bitmask and array engines"""
+    import timeit
+    example = [
+        'vJrwpWtwJgWrhcsFMMfFFhFp',
+        'jqHRNqRjqzjGDLGLrsFMfFZSrLrFZsSL',
+        'PmmdzqPrVvPwwTWBwg',
+        'wMqvLMZHhHMvwLHjbvcjnnSBnvTQFn',
+        'ttgJtRGJQctTZtZT',
+        'CrZsJsPPZsGzwwsLwLmpwMDw',
+    ]
+    sacks = example * (n_sacks // len(example))
+    buffer = '\n'.join(sacks).encode() + b'\n'
+
+    def both_arrays():
+        masks = rucksack_masks(buffer)
+        sum_repeat_priority_array(masks)
+        sum_trio_badges_array(masks)
+
+    engines = {
+        'sum_repeat_priority': lambda: sum_repeat_priority(sacks),
+        'sum_repeat_priority_bits': lambda: sum_repeat_priority_bits(sacks),
+        'sum_trio_badges': lambda: sum_trio_badges(sacks),
+        'sum_trio_badges_bits': lambda: sum_trio_badges_bits(sacks),
+        'rucksack_masks': lambda: rucksack_masks(buffer),
+        'both_parts_array': both_arrays,
+    }
+    return {
+        name: min(timeit.repeat(func, number=1, repeat=repeat))
+        for name, func in engines.items()
+    }
+
+
+def rucksack_masks(buffer: bytes) -> np.ndarray:
+    """
+    Compartment masks of every non-blank line, shape (n_sacks, 2).
+
+    >>> masks = rucksack_masks(b'abca\\nAb\\n')
+    >>> [[int(m) for m in row] for row in masks]
+    [[6, 10], [134217728, 4]]
+    """
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    ends = np.flatnonzero(data == ord('\n'))
+    if data.size and data[-1] != ord('\n'):
+        ends = np.append(ends, data.size)
+    starts = np.zeros_like(ends)
+    starts[1:] = ends[:-1] + 1
+    # A carriage return before the newline is not part of the sack
+    ends -= data[ends - 1] == ord('\r')
+    lengths = ends - starts
+    keep = lengths > 0
+    starts = starts[keep]
+    lengths = lengths[keep]
+    if starts.size == 0:
+        return np.zeros((0, 2), dtype=np.uint64)
+    # Each compartment ORs its item bits up to the next bound; line breaks
+    # and blank lines between sacks have no bits set
+    bounds = np.empty(2 * starts.size, dtype=np.intp)
+    bounds[0::2] = starts
+    bounds[1::2] = starts + lengths // 2
+    masks = np.bitwise_or.reduceat(ITEM_BIT_TABLE[data], bounds)
+    masks = masks.reshape(-1, 2)
+    # reduceat yields the first element of an empty range, not zero
+    masks[lengths == 1, 0] = 0
+    return masks
+
+
+def _sum_mask_priorities(masks: np.ndarray) -> int:
+    as_bytes = masks.astype('<u8').view(np.uint8).reshape(-1, 8)
+    bits = np.unpackbits(as_bytes, axis=1, bitorder='little')
+    # Both operands int64, so the dot product never passes through float64
+    counts = bits.sum(axis=0, dtype=np.int64)
+    return int(counts @ np.arange(64, dtype=np.int64))
+
+
+def _as_masks(sacks) -> np.ndarray:
+    if isinstance(sacks, np.ndarray):
+        return sacks
+    return rucksack_masks(sacks)
+
+
+def sum_repeat_priority_array(sacks) -> int:
+    """
+    ``sacks`` is a whole input buffer, or its rucksack_masks so that both
+    parts can share one pass over the bytes.
+
+    >>> rs = (
+    ...     b'vJrwpWtwJgWrhcsFMMfFFhFp\\n'
+    ...     b'jqHRNqRjqzjGDLGLrsFMfFZSrLrFZsSL\\n'
+    ...     b'PmmdzqPrVvPwwTWBwg\\n'
+    ...     b'wMqvLMZHhHMvwLHjbvcjnnSBnvTQFn\\n'
+    ...     b'ttgJtRGJQctTZtZT\\n'
+    ...     b'CrZsJsPPZsGzwwsLwLmpwMDw\\n'
+    ... )
+    >>> sum_repeat_priority_array(rs)
+    157
+    >>> sum_repeat_priority_array(rucksack_masks(rs))
+    157
+    """
+    masks = _as_masks(sacks)
+    return _sum_mask_priorities(masks[:, 0] & masks[:, 1])
+
+
+def sum_trio_badges_array(sacks) -> int:
+    """
+    Same input as sum_repeat_priority_array.
+
+    >>> rs = (
+    ...     b'vJrwpWtwJgWrhcsFMMfFFhFp\\n'
+    ...     b'jqHRNqRjqzjGDLGLrsFMfFZSrLrFZsSL\\n'
+    ...     b'PmmdzqPrVvPwwTWBwg\\n'
+    ...     b'wMqvLMZHhHMvwLHjbvcjnnSBnvTQFn\\n'
+    ...     b'ttgJtRGJQctTZtZT\\n'
+    ...     b'CrZsJsPPZsGzwwsLwLmpwMDw\\n'
+    ... )
+    >>> sum_trio_badges_array(rs)
+    70
+    """
+    masks = _as_masks(sacks)
+    whole = masks[:, 0] | masks[:, 1]
+    trios = whole[:whole.size - whole.size % 3].reshape(-1, 3)
+    return _sum_mask_priorities(np.bitwise_and.reduce(trios, axis=1))
+
+
 if __name__ == '__main__':
     import doctest
     doctest.testmod()
@@ -1,4 +1,8 @@
 """https://adventofcode.com/2022/day/5"""
+import random
+import re
+import timeit
+from array import array
 
 def parse_diagram(lines):
     lines = list(lines)
@@ -59,6 +63,345 @@ def move_crates(stack_lines, direction_lines, model_9000=True):
     return stacks
 
 
+
+class _CrateNode:
+    """Node of a CrateStack tree. Its subtree lists crates bottom to top."""
+    __slots__ = ('crate', 'size', 'left', 'right', 'flipped')
+
+    def __init__(self, crate, left=None, right=None):
+        self.crate = crate
+        self.left = left
+        self.right = right
+        self.flipped = False
+        self.size = 1 + _size(left) + _size(right)
+
+
+def _size(node) -> int:
+    return node.size if node is not None else 0
+
+
+def _push_flip(node):
+    if node.flipped:
+        node.left, node.right = node.right, node.left
+        for child in (node.left, node.right):
+            if child is not None:
+                child.flipped = not child.flipped
+        node.flipped = False
+
+
+def _build(crates, lo, hi):
+    if lo >= hi:
+        return None
+    mid = (lo + hi) // 2
+    return _CrateNode(
+        crates[mid], _build(crates, lo, mid), _build(crates, mid + 1, hi)
+    )
+
+
+def _split(node, count):
+    """Split into the lowest count crates and the rest"""
+    if node is None:
+        return None, None
+    _push_flip(node)
+    left_size = _size(node.left)
+    if count <= left_size:
+        lower, node.left = _split(node.left, count)
+        node.size = 1 + _size(node.left) + _size(node.right)
+        return lower, node
+    node.right, upper = _split(node.right, count - left_size - 1)
+    node.size = 1 + _size(node.left) + _size(node.right)
+    return node, upper
+
+
+def _join(lower, upper, rng):
+    """Stack upper on lower. The root is picked with odds by size, which
+    keeps the expected depth logarithmic."""
+    if lower is None:
+        return upper
+    if upper is None:
+        return lower
+    if rng.random() * (lower.size + upper.size) < lower.size:
+        _push_flip(lower)
+        lower.right = _join(lower.right, upper, rng)
+        lower.size = 1 + _size(lower.left) + _size(lower.right)
+        return lower
+    _push_flip(upper)
+    upper.left = _join(lower, upper.left, rng)
+    upper.size = 1 + _size(upper.left) + _size(upper.right)
+    return upper
+
+
+class CrateStack:
+    """
+    A stack of crates held as a randomized balanced tree. Moving any number
+    of crates is a split and a join, in expected O(log n) time, and a
+    CrateMover 9000 reversal is a lazy flag on the moved subtree.
+
+    >>> left, right = CrateStack('ZN'), CrateStack('MCD')
+    >>> right.move_to(left, 2, reverse=True)
+    >>> list(left), list(right)
+    (['Z', 'N', 'D', 'C'], ['M'])
+    >>> left.move_to(right, 3)
+    >>> list(left), list(right), right[-1], len(right)
+    (['Z'], ['M', 'N', 'D', 'C'], 'C', 4)
+    """
+    _rng = random.Random(0)
+
+    def __init__(self, crates=()):
+        crates = list(crates)
+        self.root = _build(crates, 0, len(crates))
+
+    def __len__(self) -> int:
+        return _size(self.root)
+
+    def __iter__(self):
+        # (node, flipped by an ancestor) pairs, read without pushing flags
+        pending = []
+        node, flipped = self.root, False
+        while pending or node is not None:
+            while node is not None:
+                flipped ^= node.flipped
+                pending.append((node, flipped))
+                node = node.right if flipped else node.left
+            node, flipped = pending.pop()
+            yield node.crate
+            node = node.left if flipped else node.right
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('crate index out of range')
+        node = self.root
+        while True:
+            _push_flip(node)
+            left_size = _size(node.left)
+            if index < left_size:
+                node = node.left
+            elif index == left_size:
+                return node.crate
+            else:
+                index -= left_size + 1
+                node = node.right
+
+    def move_to(self, other: 'CrateStack', number: int, reverse: bool=False):
+        number = min(number, len(self))
+        self.root, moved = _split(self.root, len(self) - number)
+        if reverse and moved is not None:
+            moved.flipped = not moved.flipped
+        other.root = _join(other.root, moved, self._rng)
+
+
+def move_crates_rope(stack_lines, direction_lines, model_9000=True):
+    """
+    Same as move_crates, but with CrateStack stacks.
+
+    >>> slines = [
+    ...     '    [D]    ',
+    ...     '[N] [C]    ',
+    ...     '[Z] [M] [P]',
+    ...     ' 1   2   3',
+    ... ]
+    >>> dlines = [
+    ...     'move 1 from 2 to 1',
+    ...     'move 3 from 1 to 3',
+    ...     'move 2 from 2 to 1',
+    ...     'move 1 from 1 to 2',
+    ... ]
+    >>> res = move_crates_rope(slines, dlines)
+    >>> ''.join(rr[-1] for rr in res)
+    'CMZ'
+    >>> res = move_crates_rope(slines, dlines, model_9000=False)
+    >>> ''.join(rr[-1] for rr in res)
+    'MCD'
+    """
+    return replay_crate_stacks(
+        compile_moves(direction_lines), parse_diagram(stack_lines), model_9000
+    )
+
+
+def compile_moves(direction_lines) -> array:
+    """
+    Flat table of (number, from_stack, to_stack) with 0-based stacks.
+
+    >>> compile_moves(['move 1 from 2 to 1', 'move 13 from 1 to 3'])
+    array('l', [1, 1, 0, 13, 0, 2])
+    """
+    if not isinstance(direction_lines, str):
+        direction_lines = '\n'.join(direction_lines)
+    moves = array('l', map(int, re.findall(r'\d+', direction_lines)))
+    moves[1::3] = array('l', (ss - 1 for ss in moves[1::3]))
+    moves[2::3] = array('l', (ss - 1 for ss in moves[2::3]))
+    return moves
+
+
+def replay_moves(moves: array, stacks, model_9000=True):
+    """Apply a compile_moves table to copies of the parsed stacks."""
+    stacks = [list(ss) for ss in stacks]
+    move_iter = iter(moves)
+    for number, from_stack, to_stack in zip(move_iter, move_iter, move_iter):
+        source = stacks[from_stack]
+        moved = source[-number:]
+        del source[-number:]
+        if model_9000:
+            moved.reverse()
+        stacks[to_stack].extend(moved)
+    return stacks
+
+
+def replay_diagrams(moves: array, diagrams, model_9000=True):
+    """
+    >>> slines = [
+    ...     '    [D]    ',
+    ...     '[N] [C]    ',
+    ...     '[Z] [M] [P]',
+    ...     ' 1   2   3',
+    ... ]
+    >>> dlines = [
+    ...     'move 1 from 2 to 1',
+    ...     'move 3 from 1 to 3',
+    ...     'move 2 from 2 to 1',
+    ...     'move 1 from 1 to 2',
+    ... ]
+    >>> table = compile_moves(dlines)
+    >>> diagram = parse_diagram(slines)
+    >>> for model in (True, False):
+    ...     for res in replay_diagrams(table, [diagram], model_9000=model):
+    ...         print(''.join(rr[-1] for rr in res))
+    CMZ
+    MCD
+    """
+    return [replay_moves(moves, stacks, model_9000) for stacks in diagrams]
+
+
+def trace_tops(moves: array, stacks, model_9000=True) -> str:
+    """
+    Top crates after a compile_moves table, found by following only the
+    final top positions back through the moves. Empty stacks are skipped.
+    """
+    heights = [len(ss) for ss in stacks]
+    move_iter = iter(moves)
+    for number, from_stack, to_stack in zip(move_iter, move_iter, move_iter):
+        heights[from_stack] -= number
+        heights[to_stack] += number
+    # [stack, height from the bottom] of each final top crate
+    tracked = [[ii, hh - 1] for ii, hh in enumerate(heights) if hh > 0]
+    for jj in range(len(moves) - 3, -1, -3):
+        number, from_stack, to_stack = moves[jj], moves[jj + 1], moves[jj + 2]
+        # Heights before this move
+        heights[from_stack] += number
+        heights[to_stack] -= number
+        base = heights[to_stack]
+        for spot in tracked:
+            if spot[0] == to_stack and spot[1] >= base:
+                offset = spot[1] - base
+                spot[0] = from_stack
+                if model_9000:
+                    spot[1] = heights[from_stack] - 1 - offset
+                else:
+                    spot[1] = heights[from_stack] - number + offset
+    return ''.join(stacks[ii][hh] for ii, hh in tracked)
+
+
+def top_crates(stack_lines, direction_lines, model_9000=True) -> str:
+    """
+    >>> slines = [
+    ...     '    [D]    ',
+    ...     '[N] [C]    ',
+    ...     '[Z] [M] [P]',
+    ...     ' 1   2   3',
+    ... ]
+    >>> dlines = [
+    ...     'move 1 from 2 to 1',
+    ...     'move 3 from 1 to 3',
+    ...     'move 2 from 2 to 1',
+    ...     'move 1 from 1 to 2',
+    ... ]
+    >>> top_crates(slines, dlines), top_crates(slines, dlines, model_9000=False)
+    ('CMZ', 'MCD')
+    """
+    moves = compile_moves(direction_lines)
+    return trace_tops(moves, parse_diagram(stack_lines), model_9000)
+
+
+def synthetic_warehouse(n_stacks=9, height=1000, n_moves=100000, seed=0):
+    """Random parsed stacks and a valid compile_moves table for them"""
+    rng = random.Random(seed)
+    letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    stacks = [
+        [rng.choice(letters) for _ in range(height)] for _ in range(n_stacks)
+    ]
+    heights = [height] * n_stacks
+    moves = array('l')
+    for _ in range(n_moves):
+        from_stack = rng.choice([ii for ii, hh in enumerate(heights) if hh])
+        to_stack = rng.randrange(n_stacks - 1)
+        if to_stack >= from_stack:
+            to_stack += 1
+        number = rng.randint(1, heights[from_stack])
+        heights[from_stack] -= number
+        heights[to_stack] += number
+        moves.extend((number, from_stack, to_stack))
+    return stacks, moves
+
+
+def benchmark_top_crates(n_stacks=9, height=1000, n_moves=100000, repeat=3):
+    """
+    Best time in seconds of full replay versus trace_tops.
+
+    >>> times = benchmark_top_crates(height=20, n_moves=200, repeat=1)
+    >>> sorted(times)
+    ['replay_moves', 'trace_tops']
+    """
+    stacks, moves = synthetic_warehouse(n_stacks, height, n_moves)
+    times = {}
+    for model_9000 in (True, False):
+        full = replay_moves(moves, stacks, model_9000)
+        full_tops = ''.join(ss[-1] for ss in full if ss)
+        assert trace_tops(moves, stacks, model_9000) == full_tops
+    times['replay_moves'] = min(timeit.repeat(
+        lambda: replay_moves(moves, stacks), number=1, repeat=repeat
+    ))
+    times['trace_tops'] = min(timeit.repeat(
+        lambda: trace_tops(moves, stacks), number=1, repeat=repeat
+    ))
+    return times
+
+
+def replay_crate_stacks(moves: array, stacks, model_9000=True):
+    """replay_moves with CrateStack stacks"""
+    stacks = [CrateStack(ss) for ss in stacks]
+    move_iter = iter(moves)
+    for number, from_stack, to_stack in zip(move_iter, move_iter, move_iter):
+        stacks[from_stack].move_to(stacks[to_stack], number, reverse=model_9000)
+    return stacks
+
+
+def benchmark_crate_stacks(n_stacks=9, height=100000, n_moves=20000, repeat=1):
+    """
+    Best time in seconds of list stacks versus CrateStack on tall stacks.
+    Plain lists stay faster while stacks are only a few thousand high.
+
+    >>> times = benchmark_crate_stacks(height=20, n_moves=200)
+    >>> sorted(times)
+    ['replay_crate_stacks', 'replay_moves']
+    """
+    stacks, moves = synthetic_warehouse(n_stacks, height, n_moves)
+    for model_9000 in (True, False):
+        expected = replay_moves(moves, stacks, model_9000)
+        crate_stacks = replay_crate_stacks(moves, stacks, model_9000)
+        assert [list(ss) for ss in crate_stacks] == expected
+    return {
+        name: min(timeit.repeat(
+            lambda: replay(moves, stacks), number=1, repeat=repeat
+        ))
+        for name, replay in (
+            ('replay_moves', replay_moves),
+            ('replay_crate_stacks', replay_crate_stacks),
+        )
+    }
+
+
 if __name__ == '__main__':
     import doctest
     doctest.testmod()
@@ -74,9 +417,11 @@ if __name__ == '__main__':
                 stack_lines.append(line)
             else:
                 direction_lines.append(line)
+    move_table = compile_moves(direction_lines)
+    start_stacks = parse_diagram(stack_lines)
     # Part1
-    stacks1 = move_crates(stack_lines, direction_lines)
+    stacks1 = replay_moves(move_table, start_stacks)
     print(''.join(ss[-1] for ss in stacks1))
     # Part2
-    stacks2 = move_crates(stack_lines, direction_lines, model_9000=False)
+    stacks2 = replay_moves(move_table, start_stacks, model_9000=False)
     print(''.join(ss[-1] for ss in stacks2))
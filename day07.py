@@ -1,4 +1,7 @@
 """https://adventofcode.com/2022/day/7"""
+import bisect
+import itertools
+import sys
 from pathlib import Path
 
 def process_file_system(lines: list) -> dict:
@@ -72,6 +75,212 @@ def delete_dir_size(file_system, system_size=70000000, needed_space=30000000) ->
     return delete_size
 
 
+class _DirectoryNodes:
+    """
+    Directories as integer nodes with parent pointers and interned names.
+    Node 0 is the root, and every node is created after its parent.
+    Subclasses keep more per-node lists by extending _add_node.
+    """
+    def __init__(self):
+        self.names = []
+        self.parents = []
+        self.children = []
+        self._cwd = 0
+        self._add_node(0, '')
+
+    def _add_node(self, parent: int, name: str) -> int:
+        node = len(self.names)
+        self.names.append(name)
+        self.parents.append(parent)
+        self.children.append(dict())
+        return node
+
+    def _child(self, node: int, name: str) -> int:
+        child = self.children[node].get(name)
+        if child is None:
+            name = sys.intern(name)
+            child = self._add_node(node, name)
+            self.children[node][name] = child
+        return child
+
+    def _cd(self, current: int, dirname: str) -> int:
+        if dirname == '/':
+            return 0
+        if dirname == '..':
+            return self.parents[current]
+        return self._child(current, dirname)
+
+    def _prefixes(self) -> list:
+        """Path of every node, with the root as an empty string"""
+        prefixes = ['']
+        for node in range(1, len(self.names)):
+            prefixes.append(prefixes[self.parents[node]] + '/' + self.names[node])
+        return prefixes
+
+    def path(self, node: int) -> str:
+        parts = []
+        while node != 0:
+            parts.append(self.names[node])
+            node = self.parents[node]
+        return '/' + '/'.join(reversed(parts))
+
+
+class DirectoryTree(_DirectoryNodes):
+    """
+    >>> tree = DirectoryTree(example_commands)
+    >>> tree.path(3), tree.directory_sizes()[3]
+    ('/a/e', 584)
+    >>> tree.file_system() == process_file_system(example_commands)
+    True
+    """
+    def __init__(self, lines=()):
+        # {<name: str>: <size: int>} of the files directly in each node
+        self.files = []
+        super().__init__()
+        self.feed(lines)
+
+    def _add_node(self, parent: int, name: str) -> int:
+        self.files.append(dict())
+        return super()._add_node(parent, name)
+
+    def feed(self, lines):
+        current = self._cwd
+        for line in lines:
+            if line[:4] == '$ cd':
+                current = self._cd(current, line[5:])
+            elif line[:3] == 'dir':
+                self._child(current, line[4:])
+            elif line[0].isdigit():
+                size, _, name = line.partition(' ')
+                self.files[current].setdefault(sys.intern(name), int(size))
+        self._cwd = current
+
+    def directory_sizes(self) -> list:
+        totals = [sum(ff.values()) for ff in self.files]
+        # Children always have larger ids, so this is a post-order pass
+        for node in range(len(totals) - 1, 0, -1):
+            totals[self.parents[node]] += totals[node]
+        return totals
+
+    def file_system(self) -> dict:
+        """Same shape as the process_file_system result"""
+        prefixes = self._prefixes()
+        files = {
+            prefix + '/' + name: size
+            for prefix, dir_files in zip(prefixes, self.files)
+            for name, size in dir_files.items()
+        }
+        prefixes[0] = '/'
+        directories = dict(zip(prefixes, self.directory_sizes()))
+        return {'files': files, 'directories': directories}
+
+
+class SizeIndex:
+    """
+    Sorted directory sizes with prefix sums, for repeated queries against
+    one process_file_system result.
+
+    >>> index = SizeIndex(process_file_system(example_commands))
+    >>> index.sum_small_dirs(100000)
+    95437
+    >>> index.delete_dir_size()
+    24933642
+    >>> index.sum_small_dirs_many([0, 584, 100000])
+    [0, 584, 95437]
+    >>> index.delete_dir_sizes([(70000000, 30000000), (50000000, 10000000), (48381165, 0)])
+    [24933642, 24933642, 584]
+    """
+    def __init__(self, file_system):
+        self.sizes = sorted(file_system['directories'].values())
+        self.prefix_sums = [0]
+        self.prefix_sums.extend(itertools.accumulate(self.sizes))
+        self.used_size = file_system['directories']['/']
+
+    def sum_small_dirs(self, threshold) -> int:
+        return self.prefix_sums[bisect.bisect_right(self.sizes, threshold)]
+
+    def delete_dir_size(self, system_size=70000000, needed_space=30000000) -> int:
+        still_needed = needed_space - (system_size - self.used_size)
+        idx = bisect.bisect_left(self.sizes, still_needed)
+        if idx == len(self.sizes):
+            return self.used_size
+        return min(self.sizes[idx], self.used_size)
+
+    def sum_small_dirs_many(self, thresholds) -> list:
+        return [self.sum_small_dirs(threshold) for threshold in thresholds]
+
+    def delete_dir_sizes(self, queries) -> list:
+        """Answer delete_dir_size for each (system_size, needed_space) pair"""
+        return [self.delete_dir_size(*query) for query in queries]
+
+
+class LiveFileSystem(_DirectoryNodes):
+    """
+    Directory totals kept up to date while a transcript is still arriving.
+    Only directories are stored; a directory's files are counted from its
+    first listing and later listings of it are skipped.
+
+    >>> live = LiveFileSystem()
+    >>> live.feed(example_commands[:12])
+    >>> live.directories()
+    {'/': 23446939, '/a': 94269, '/d': 0, '/a/e': 0}
+    >>> live.feed(example_commands[12:])
+    >>> live.sum_small_dirs(100000), live.delete_dir_size()
+    (95437, 24933642)
+    >>> live.feed(['$ cd /', '$ cd a', '$ ls', '29116 f'])
+    >>> live.directories() == process_file_system(example_commands)['directories']
+    True
+    """
+    def __init__(self, lines=()):
+        self.totals = []
+        self.listed = []
+        self._counting = False
+        super().__init__()
+        self.feed(lines)
+
+    def _add_node(self, parent: int, name: str) -> int:
+        self.totals.append(0)
+        self.listed.append(False)
+        return super()._add_node(parent, name)
+
+    def feed(self, lines):
+        current = self._cwd
+        for line in lines:
+            if line[:4] == '$ cd':
+                self._counting = False
+                current = self._cd(current, line[5:])
+            elif line[:4] == '$ ls':
+                self._counting = not self.listed[current]
+                self.listed[current] = True
+            elif line[:3] == 'dir':
+                self._child(current, line[4:])
+            elif line[0].isdigit() and self._counting:
+                size = int(line.partition(' ')[0])
+                node = current
+                while node != 0:
+                    self.totals[node] += size
+                    node = self.parents[node]
+                self.totals[0] += size
+        self._cwd = current
+
+    def directories(self) -> dict:
+        paths = self._prefixes()
+        paths[0] = '/'
+        return dict(zip(paths, self.totals))
+
+    def sum_small_dirs(self, threshold) -> int:
+        return sum(size for size in self.totals if size <= threshold)
+
+    def delete_dir_size(self, system_size=70000000, needed_space=30000000) -> int:
+        used_size = self.totals[0]
+        still_needed = needed_space - (system_size - used_size)
+        delete_size = used_size
+        for size in self.totals:
+            if still_needed <= size < delete_size:
+                delete_size = size
+        return delete_size
+
+
 if __name__ == '__main__':
     import doctest
     test_context = globals().copy()
@@ -1,4 +1,11 @@
 """https://adventofcode.com/2022/day/9"""
+import itertools
+from array import array
+
+import numpy as np
+
+DIRECTIONS = {'R': (1, 0), 'L': (-1, 0), 'U': (0, 1), 'D': (0, -1)}
+
 
 def is_adjacent(p1, p2):
     return abs(p1[0] - p2[0]) <= 1 and abs(p1[1] - p2[1]) <= 1
@@ -64,6 +71,224 @@ class Rope:
                 self.tail_path.add(self.parts[-1])
 
 
+class RunRope(Rope):
+    """
+    Once every knot moves with the head on a step, the rest of the move is
+    a straight translation, so it is applied in one go.
+
+    >>> r = RunRope()
+    >>> commands = ['R 4', 'U 4', 'L 3', 'D 1', 'R 4', 'D 1', 'L 5', 'R 2']
+    >>> for com in commands: r.follow_instruction(com)
+    >>> len(r.tail_path)
+    13
+    >>> r = RunRope(10)
+    >>> for com in ['R 5', 'U 8', 'L 8', 'D 3', 'R 17', 'D 10', 'L 25', 'U 20']:
+    ...     r.follow_instruction(com)
+    >>> len(r.tail_path)
+    36
+    """
+    def follow_instruction(self, text):
+        direction, steps = text.strip().split(' ')
+        steps = int(steps)
+        dx, dy = DIRECTIONS[direction]
+        parts = self.parts
+        while steps:
+            hx, hy = parts[0]
+            hx, hy = hx + dx, hy + dy
+            parts[0] = (hx, hy)
+            steady = True
+            for ii in range(1, len(parts)):
+                tx, ty = parts[ii]
+                gap_x, gap_y = hx - tx, hy - ty
+                if -1 <= gap_x <= 1 and -1 <= gap_y <= 1:
+                    # Nothing further down the rope moves either
+                    steady = False
+                    break
+                step_x = (gap_x > 0) - (gap_x < 0)
+                step_y = (gap_y > 0) - (gap_y < 0)
+                if step_x != dx or step_y != dy:
+                    steady = False
+                hx, hy = tx + step_x, ty + step_y
+                parts[ii] = (hx, hy)
+            steps -= 1
+            self.tail_path.add(parts[-1])
+            if steady and steps:
+                tx, ty = parts[-1]
+                if dx:
+                    xs = range(tx + dx, tx + dx * (steps + 1), dx)
+                else:
+                    xs = itertools.repeat(tx, steps)
+                if dy:
+                    ys = range(ty + dy, ty + dy * (steps + 1), dy)
+                else:
+                    ys = itertools.repeat(ty, steps)
+                self.tail_path.update(zip(xs, ys))
+                parts[:] = [(x + dx * steps, y + dy * steps) for x, y in parts]
+                steps = 0
+
+
+class VisitBitmap:
+    """
+    Set of visited cells kept as 64x64 bit tiles, so each cell costs a bit.
+
+    >>> vb = VisitBitmap()
+    >>> for cell in [(0, 0), (1, 0), (0, 0), (-70, 5), (200, -300)]:
+    ...     vb.add(*cell)
+    >>> len(vb), vb.contains(-70, 5), vb.contains(5, -70)
+    (4, True, False)
+    """
+    TILE_BITS = 6
+    TILE_SIZE = 1 << TILE_BITS
+
+    def __init__(self):
+        # {<tile key: int>: <64 rows of 64 bits: bytearray>}
+        self.tiles = dict()
+        self._last_key = None
+        self._last_tile = None
+
+    def _locate(self, x: int, y: int):
+        key = ((x >> self.TILE_BITS) << 32) + (y >> self.TILE_BITS)
+        mask = self.TILE_SIZE - 1
+        offset = ((y & mask) << self.TILE_BITS) + (x & mask)
+        return key, offset
+
+    def add(self, x: int, y: int):
+        key, offset = self._locate(x, y)
+        if key != self._last_key:
+            tile = self.tiles.get(key)
+            if tile is None:
+                tile = self.tiles[key] = bytearray(self.TILE_SIZE ** 2 // 8)
+            self._last_key, self._last_tile = key, tile
+        self._last_tile[offset >> 3] |= 1 << (offset & 7)
+
+    def contains(self, x: int, y: int) -> bool:
+        key, offset = self._locate(x, y)
+        tile = self.tiles.get(key)
+        return tile is not None and bool(tile[offset >> 3] & (1 << (offset & 7)))
+
+    def __len__(self) -> int:
+        return sum(
+            int.from_bytes(tile, 'little').bit_count()
+            for tile in self.tiles.values()
+        )
+
+
+class MultiRope:
+    """
+    Ropes of several lengths in one pass. The first n knots of a long rope
+    move exactly like a rope of length n, so only the longest is simulated.
+
+    >>> mr = MultiRope((2, 10))
+    >>> commands = ['R 4', 'U 4', 'L 3', 'D 1', 'R 4', 'D 1', 'L 5', 'R 2']
+    >>> for com in commands: mr.follow_instruction(com)
+    >>> mr.visited_count(2), mr.visited_count(10)
+    (13, 1)
+    """
+    def __init__(self, lengths=(2, 10)):
+        self.lengths = sorted(set(lengths))
+        n_knots = self.lengths[-1]
+        self.xs = array('l', [0] * n_knots)
+        self.ys = array('l', [0] * n_knots)
+        self.visited = {length: VisitBitmap() for length in self.lengths}
+        for bitmap in self.visited.values():
+            bitmap.add(0, 0)
+        # Knot index whose visits are recorded for each length
+        self._tails = [(length - 1, self.visited[length]) for length in self.lengths]
+
+    def follow_instruction(self, text):
+        direction, steps = text.strip().split(' ')
+        dx, dy = DIRECTIONS[direction]
+        xs, ys = self.xs, self.ys
+        n_knots = len(xs)
+        for _ in range(int(steps)):
+            xs[0] += dx
+            ys[0] += dy
+            moved = 1
+            for ii in range(1, n_knots):
+                gap_x = xs[ii - 1] - xs[ii]
+                gap_y = ys[ii - 1] - ys[ii]
+                if -1 <= gap_x <= 1 and -1 <= gap_y <= 1:
+                    break
+                xs[ii] += (gap_x > 0) - (gap_x < 0)
+                ys[ii] += (gap_y > 0) - (gap_y < 0)
+                moved += 1
+            for knot, bitmap in self._tails:
+                if knot >= moved:
+                    break
+                bitmap.add(xs[knot], ys[knot])
+
+    def visited_count(self, length: int) -> int:
+        return len(self.visited[length])
+
+
+def _head_steps(commands) -> np.ndarray:
+    """Unit head moves of one instruction list, shape (n_steps, 2)"""
+    deltas, counts = [], []
+    for text in commands:
+        direction, steps = text.strip().split(' ')
+        deltas.append(DIRECTIONS[direction])
+        counts.append(int(steps))
+    if not deltas:
+        return np.zeros((0, 2), dtype=np.int64)
+    return np.repeat(np.array(deltas, dtype=np.int64), counts, axis=0)
+
+
+def _unique_pairs(first: np.ndarray, second: np.ndarray):
+    """Distinct (first, second) pairs, sorted by first and then second"""
+    order = np.lexsort((second, first))
+    first = first[order]
+    second = second[order]
+    fresh = np.ones(first.size, dtype=bool)
+    fresh[1:] = (first[1:] != first[:-1]) | (second[1:] != second[:-1])
+    return first[fresh], second[fresh]
+
+
+def batch_visited_counts(instruction_sets, length=2, chunk_steps=4096) -> list:
+    """
+    Number of cells the tail visits for each independent instruction list.
+    All ropes are held in one (n_ropes, length, 2) array and stepped together.
+
+    >>> commands = ['R 4', 'U 4', 'L 3', 'D 1', 'R 4', 'D 1', 'L 5', 'R 2']
+    >>> batch_visited_counts([commands, commands[:3], []])
+    [13, 9, 1]
+    >>> batch_visited_counts([commands, ['R 15', 'U 3']], length=10)
+    [1, 8]
+    """
+    head_steps = [_head_steps(commands) for commands in instruction_sets]
+    n_ropes = len(head_steps)
+    n_steps = max((len(hs) for hs in head_steps), default=0)
+    # Shorter lists are padded with zero moves, which leave every knot put
+    moves = np.zeros((n_steps, n_ropes, 2), dtype=np.int64)
+    for ii, hs in enumerate(head_steps):
+        moves[:len(hs), ii] = hs
+    # Encode (x, y) as one integer key for counting distinct cells; the rope
+    # is kept in its own column so n_ropes never widens the key
+    reach = n_steps + 1
+    width = 2 * reach + 1
+    if width * width >= 2 ** 63:
+        raise ValueError(f'Too many steps to key tail cells: {n_steps}')
+    knots = np.zeros((n_ropes, length, 2), dtype=np.int64)
+    rope_ids = np.arange(n_ropes, dtype=np.int64)
+    seen_ropes = rope_ids
+    seen_cells = np.full(n_ropes, reach * width + reach, dtype=np.int64)
+    for start in range(0, n_steps, chunk_steps):
+        chunk = moves[start:start + chunk_steps]
+        tail_keys = np.empty((len(chunk), n_ropes), dtype=np.int64)
+        for tt, head_move in enumerate(chunk):
+            knots[:, 0] += head_move
+            for kk in range(1, length):
+                gap = knots[:, kk - 1] - knots[:, kk]
+                far = (np.abs(gap) > 1).any(axis=1)
+                knots[far, kk] += np.sign(gap[far])
+            tail = knots[:, -1]
+            tail_keys[tt] = (tail[:, 0] + reach) * width + tail[:, 1] + reach
+        seen_ropes, seen_cells = _unique_pairs(
+            np.concatenate([seen_ropes, np.tile(rope_ids, len(chunk))]),
+            np.concatenate([seen_cells, tail_keys.ravel()]),
+        )
+    return np.bincount(seen_ropes, minlength=n_ropes).tolist()
+
+
 if __name__ == '__main__':
     import doctest
     doctest.testmod()
@@ -2,23 +2,37 @@
 
 import functools
 import operator
+import os
+from concurrent.futures import ProcessPoolExecutor
 from typing import List
 from types import FunctionType
 
+import numpy as np
 
-def make_operator(token1: str, token2: str, operator: FunctionType) -> FunctionType:
-    if token1 == 'old' and token2 == 'old':
-        def operation(old):
-            return operator(old, old)
-    elif token1 == 'old' and token2 != 'old':
-        t2_val = int(token2)
-        def operation(old):
-            return operator(old, t2_val)
-    elif token1 != 'old' and token2 == 'old':
-        t1_val = int(token1)
-        def operation(old):
-            return operator(t1_val, old)
-    return operation
+
+class Operation:
+    """
+    Callable for "new = token1 op token2". Unlike a closure, it can be
+    pickled and sent to worker processes.
+
+    >>> Operation('old', 'old', operator.mul)(7)
+    49
+    >>> Operation('3', 'old', operator.sub)(1)
+    2
+    """
+    def __init__(self, token1: str, token2: str, operator: FunctionType):
+        self.operator = operator
+        self.value1 = None if token1 == 'old' else int(token1)
+        self.value2 = None if token2 == 'old' else int(token2)
+
+    def __call__(self, old: int) -> int:
+        value1 = old if self.value1 is None else self.value1
+        value2 = old if self.value2 is None else self.value2
+        return self.operator(value1, value2)
+
+
+def make_operator(token1: str, token2: str, operator: FunctionType) -> Operation:
+    return Operation(token1, token2, operator)
 
 
 class Monkey:
@@ -143,6 +157,30 @@ class MonkeyGame:
     >>> mg.item_driven_rounds(n_rounds=10000)
     >>> mg.monkey_business()
     2713310158
+    >>> mg = MonkeyGame(m, calm_factor=1)
+    >>> mg.item_driven_rounds(n_rounds=10000, skip_cycles=True)
+    >>> mg.monkey_business()
+    2713310158
+    >>> mg = MonkeyGame(m, calm_factor=1)
+    >>> mg.item_driven_rounds(n_rounds=10 ** 12, skip_cycles=True)
+    >>> mg.monkey_business()
+    27142382301385558311211320
+    >>> mg = MonkeyGame(m, calm_factor=3)
+    >>> mg.queue_rounds(n_rounds=20)
+    >>> mg.inspections
+    [101, 95, 7, 105]
+    >>> mg = MonkeyGame(m, calm_factor=1)
+    >>> mg.queue_rounds(n_rounds=10000)
+    >>> mg.monkey_business()
+    2713310158
+    >>> mg = MonkeyGame(m, calm_factor=1)
+    >>> mg.parallel_item_rounds(n_rounds=10000, workers=3)
+    >>> mg.monkey_business()
+    2713310158
+    >>> mg = MonkeyGame(m, calm_factor=1)
+    >>> mg.lockstep_rounds(n_rounds=10000)
+    >>> mg.monkey_business()
+    2713310158
     """
     def __init__(self, monkeys: List[Monkey], calm_factor: int=3):
         self.monkeys = list(monkeys)
@@ -175,16 +213,54 @@ class MonkeyGame:
                         self._items[ii] = val
                         self._owners[ii] = recipient
 
-    def item_driven_rounds(self, n_rounds: int):
+    def queue_rounds(self, n_rounds: int=1):
+        """Same as progress_round, but each monkey keeps its own item list."""
+        big_div = functools.reduce(
+            operator.mul,
+            (monk.test_div for monk in self.monkeys)
+        )
+        held = [[] for _ in range(self._n_monkeys)]
+        for owner, val in zip(self._owners, self._items):
+            held[owner].append(val)
+        for _ in range(n_rounds):
+            for nn, monk in enumerate(self.monkeys):
+                items = held[nn]
+                held[nn] = []
+                self.inspections[nn] += len(items)
+                for val in items:
+                    val = monk.operation(val)
+                    if self.calm_factor != 1:
+                        val = val // self.calm_factor
+                    else:
+                        val = val % big_div
+                    held[monk.test(val)].append(val)
+        self._items = []
+        self._owners = []
+        for nn, items in enumerate(held):
+            self._items.extend(items)
+            self._owners.extend([nn] * len(items))
+
+    def item_driven_rounds(self, n_rounds: int, skip_cycles: bool=False):
+        """
+        With skip_cycles, each item's (owner, worry) state at the start of
+        every round is remembered. When one repeats, the throws since then
+        are a cycle, and whole repeats of it are counted without throwing.
+        """
         big_div = functools.reduce(
             operator.mul,
             (monk.test_div for monk in self.monkeys)
         )
         for item, owner in zip(self._items, self._owners):
             elapsed = 0
+            # {(owner, item): (elapsed, len(trail))} at the start of rounds
+            seen = {(owner, item): (0, 0)} if skip_cycles else None
+            # Monkeys that inspected this item, in order, while seeking a cycle
+            trail = []
             while elapsed < n_rounds:
                 monk = self.monkeys[owner]
                 self.inspections[owner] += 1
+                if seen is not None:
+                    trail.append(owner)
                 item = monk.operation(item)
                 if self.calm_factor != 1:
                     item = item // self.calm_factor
@@ -193,13 +269,147 @@ class MonkeyGame:
                 recipient = monk.test(item)
                 if recipient < owner:
                     elapsed += 1
+                    if seen is not None:
+                        state = (recipient, item)
+                        if state in seen:
+                            then_elapsed, then_length = seen[state]
+                            period = elapsed - then_elapsed
+                            repeats = (n_rounds - elapsed) // period
+                            for nn in trail[then_length:]:
+                                self.inspections[nn] += repeats
+                            elapsed += repeats * period
+                            seen = None
+                        else:
+                            seen[state] = (elapsed, len(trail))
                 owner = recipient
 
+    def parallel_item_rounds(
+        self, n_rounds: int, workers: int=None, skip_cycles: bool=False
+    ):
+        """item_driven_rounds with the items split across worker processes"""
+        if workers is None:
+            workers = os.cpu_count() or 1
+        workers = max(1, min(workers, len(self._items)))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(
+                    _item_rounds_worker, self.monkeys, self.calm_factor,
+                    self._items[ii::workers], self._owners[ii::workers],
+                    n_rounds, skip_cycles,
+                )
+                for ii in range(workers)
+            ]
+            for fut in futures:
+                for nn, count in enumerate(fut.result()):
+                    self.inspections[nn] += count
+
+    def lockstep_rounds(self, n_rounds: int):
+        """
+        item_driven_rounds for calm_factor 1, with every item advanced
+        together by MonkeyTable.
+        """
+        if self.calm_factor != 1:
+            raise ValueError('lockstep_rounds only supports calm_factor=1')
+        big_div = functools.reduce(
+            operator.mul,
+            (monk.test_div for monk in self.monkeys)
+        )
+        table = MonkeyTable(self.monkeys)
+        counts = table.lockstep_rounds(self._items, self._owners, n_rounds, big_div)
+        for nn, count in enumerate(counts.tolist()):
+            self.inspections[nn] += count
+
     def monkey_business(self):
         most_active = list(sorted(self.inspections))[-2:]
         return most_active[0] * most_active[1]
 
 
+ADD = 0
+MULTIPLY = 1
+SQUARE = 2
+
+
+class MonkeyTable:
+    """
+    Monkeys compiled into parallel arrays, indexed by monkey number.
+
+    >>> text = [
+    ...     'Starting items: 79, 60, 97',
+    ...     'Operation: new = old * old',
+    ...     'Test: divisible by 13',
+    ...     'If true: throw to monkey 1',
+    ...     'If false: throw to monkey 0',
+    ... ]
+    >>> table = MonkeyTable([Monkey.from_lines(text)])
+    >>> table.kinds.tolist(), table.divisors.tolist(), table.true_dests.tolist()
+    ([2], [13], [1])
+    """
+    def __init__(self, monkeys: List[Monkey]):
+        kinds, operands = [], []
+        for monk in monkeys:
+            operation = monk.operation
+            if not isinstance(operation, Operation):
+                raise TypeError('Monkey operations must be Operation objects')
+            if operation.operator not in (operator.add, operator.mul):
+                raise ValueError(f'Unsupported operator {operation.operator}')
+            if operation.value1 is None and operation.value2 is None:
+                if operation.operator is operator.mul:
+                    kinds.append(SQUARE)
+                    operands.append(0)
+                else:
+                    kinds.append(MULTIPLY)
+                    operands.append(2)
+            else:
+                value = operation.value2 if operation.value1 is None else operation.value1
+                kinds.append(ADD if operation.operator is operator.add else MULTIPLY)
+                operands.append(value)
+        self.kinds = np.array(kinds, dtype=np.int8)
+        self.operands = np.array(operands, dtype=np.int64)
+        self.divisors = np.array([mm.test_div for mm in monkeys], dtype=np.int64)
+        self.true_dests = np.array([mm.test_true_dest for mm in monkeys], dtype=np.intp)
+        self.false_dests = np.array([mm.test_false_dest for mm in monkeys], dtype=np.intp)
+
+    def lockstep_rounds(self, items, owners, n_rounds: int, big_div: int) -> np.ndarray:
+        """
+        Inspections per monkey after every item is thrown, one throw per
+        item per step, until each has done n_rounds rounds. Worry levels
+        are kept modulo big_div.
+        """
+        largest = (big_div - 1) * max(big_div - 1, int(self.operands.max(initial=0)))
+        dtype = np.int64 if largest < 2 ** 63 else object
+        worry = np.array(items, dtype=dtype) % big_div
+        owner = np.array(owners, dtype=np.intp)
+        elapsed = np.zeros(len(owner), dtype=np.int64)
+        operands = self.operands.astype(dtype)
+        divisors = self.divisors.astype(dtype)
+        inspections = np.zeros(len(self.kinds), dtype=np.int64)
+        if n_rounds <= 0:
+            return inspections
+        while owner.size:
+            inspections += np.bincount(owner, minlength=len(inspections))
+            kind = self.kinds[owner]
+            factor = np.where(kind == SQUARE, worry, operands[owner])
+            worry = np.where(kind == ADD, worry + factor, worry * factor) % big_div
+            recipient = np.where(
+                worry % divisors[owner] == 0,
+                self.true_dests[owner], self.false_dests[owner],
+            )
+            elapsed += recipient < owner
+            owner = recipient
+            active = elapsed < n_rounds
+            if not active.all():
+                worry, owner, elapsed = worry[active], owner[active], elapsed[active]
+        return inspections
+
+
+def _item_rounds_worker(monkeys, calm_factor, items, owners, n_rounds, skip_cycles):
+    game = MonkeyGame(monkeys, calm_factor=calm_factor)
+    game._items = list(items)
+    game._owners = list(owners)
+    game.item_driven_rounds(n_rounds, skip_cycles=skip_cycles)
+    return game.inspections
+
+
 if __name__ == '__main__':
     import doctest
     doctest.testmod()
@@ -1,20 +1,102 @@
 """https://adventofcode.com/2022/day/13"""
+import functools
+import json
+import random
+import re
+import timeit
+from array import array
 from collections import deque
+from itertools import accumulate
 from typing import Iterable, Generator
 
+# Markers in flat token streams; packet integers are never negative
+OPEN = -1
+CLOSE = -2
+_DROP_ITEM_CHARS = str.maketrans('', '', '0123456789, ')
+_BRACKET_STEPS = {'[': 1, ']': -1}
+# Spaces may pad punctuation, but never split a number
+_PUNCTUATION_SPACES = re.compile(r' *([\[\],]) *')
 
-def parse_packets(stream) -> Generator:
+
+def tokenize_packet(text: str) -> array:
+    """
+    >>> tokenize_packet('[1,[2,[]],10]')
+    array('l', [-1, 1, -1, 2, -1, -2, -2, 10, -2])
+    >>> tokenize_packet('[1],[2]')
+    Traceback (most recent call last):
+    ...
+    ValueError: Malformed packet: '[1],[2]'
+    >>> tokenize_packet('[ 1, [ ] ]')
+    array('l', [-1, 1, -1, -2, -2])
+    >>> tokenize_packet('[1 2]')
+    Traceback (most recent call last):
+    ...
+    ValueError: Malformed packet: '[1 2]'
+    >>> tokenize_packet('[1,,2]')
+    Traceback (most recent call last):
+    ...
+    ValueError: Malformed packet: '[1,,2]'
+    >>> tokenize_packet('[99999999999999999999]')
+    Traceback (most recent call last):
+    ...
+    ValueError: Malformed packet: '[99999999999999999999]'
+    """
+    text = text.strip()
+    compact = text
+    if ' ' in compact:
+        compact = _PUNCTUATION_SPACES.sub(r'\1', compact)
+    # Anything but digits, commas and spaces must form one list, so the
+    # depth stays positive until the final bracket closes it
+    brackets = compact.translate(_DROP_ITEM_CHARS)
+    try:
+        depths = list(accumulate(map(_BRACKET_STEPS.__getitem__, brackets)))
+    except KeyError:
+        depths = None
+    if not depths or depths[-1] or min(depths[:-1], default=1) < 1:
+        raise ValueError(f'Malformed packet: {text!r}')
+    # Every item must now be non-empty and comma-separated. The space after
+    # a close marker makes int() reject anything glued onto it.
+    marked = compact.replace('[]', '-1,-2 ')
+    marked = marked.replace('[', '-1,').replace(']', ',-2 ')
+    try:
+        return array('l', map(int, marked.split(',')))
+    except (ValueError, OverflowError):
+        raise ValueError(f'Malformed packet: {text!r}') from None
+
+
+def parse_packet(text: str) -> list:
+    """
+    >>> parse_packet('[1,[2,[]],10]')
+    [1, [2, []], 10]
+    >>> parse_packet('__import__("os")')
+    Traceback (most recent call last):
+    ...
+    ValueError: Malformed packet: '__import__("os")'
+    """
+    stack = [[]]
+    for tt in tokenize_packet(text):
+        if tt == OPEN:
+            inner = []
+            stack[-1].append(inner)
+            stack.append(inner)
+        elif tt == CLOSE:
+            stack.pop()
+        else:
+            stack[-1].append(tt)
+    return stack[0][0]
+
+
+def parse_packets(stream, parser=parse_packet) -> Generator:
     packets = []
     for line in stream:
         line = line.replace('\n', '')
         if line:
-            packets.append(eval(line))
+            packets.append(parser(line))
             if len(packets) == 2:
                 yield packets
                 packets = []
 
 
-# Unsafe for general code, but meh.  Let's hurry onto the next day.
 def correct_order(packet1: Iterable, packet2: Iterable) -> bool:
     """
     >>> correct_order([1,1,3,1,1], [1,1,5,1,1])
@@ -58,6 +140,76 @@ def correct_order(packet1: Iterable, packet2: Iterable) -> bool:
     raise RuntimeError('Finished logic without resolution')
 
 
+def correct_order_tokens(left: array, right: array) -> bool:
+    """
+    correct_order for tokenize_packet streams, walked with two cursors.
+    An integer met by a list is treated as wrapped in extra brackets by
+    counting the closing brackets it still owes.
+
+    >>> tp = tokenize_packet
+    >>> correct_order_tokens(tp('[1,1,3,1,1]'), tp('[1,1,5,1,1]'))
+    True
+    >>> correct_order_tokens(tp('[[1],[2,3,4]]'), tp('[[1],4]'))
+    True
+    >>> correct_order_tokens(tp('[9]'), tp('[[8,7,6]]'))
+    False
+    >>> correct_order_tokens(tp('[[4,4],4,4]'), tp('[[4,4],4,4,4]'))
+    True
+    >>> correct_order_tokens(tp('[7,7,7,7]'), tp('[7,7,7]'))
+    False
+    >>> correct_order_tokens(tp('[]'), tp('[3]'))
+    True
+    >>> correct_order_tokens(tp('[[[]]]'), tp('[[]]'))
+    False
+    >>> correct_order_tokens(tp('[1,[2,[3,[4,[5,6,7]]]],8,9]'), tp('[1,[2,[3,[4,[5,6,0]]]],8,9]'))
+    False
+    >>> print(correct_order_tokens(tp('[[1]]'), tp('[1]')))
+    None
+    """
+    ii = jj = 0
+    # Closing brackets owed by a promoted integer, paid once it is consumed
+    left_owed = right_owed = 0
+    left_paying = right_paying = False
+    n_left = len(left)
+    while ii < n_left:
+        aa = CLOSE if left_paying else left[ii]
+        bb = CLOSE if right_paying else right[jj]
+        if aa == CLOSE or bb == CLOSE:
+            if aa != CLOSE:
+                return False
+            if bb != CLOSE:
+                return True
+            if left_paying:
+                left_owed -= 1
+                left_paying = left_owed > 0
+            else:
+                ii += 1
+            if right_paying:
+                right_owed -= 1
+                right_paying = right_owed > 0
+            else:
+                jj += 1
+        elif aa == OPEN and bb == OPEN:
+            ii += 1
+            jj += 1
+        elif aa == OPEN:
+            ii += 1
+            right_owed += 1
+        elif bb == OPEN:
+            jj += 1
+            left_owed += 1
+        elif aa < bb:
+            return True
+        elif aa > bb:
+            return False
+        else:
+            ii += 1
+            jj += 1
+            left_paying = left_owed > 0
+            right_paying = right_owed > 0
+    return None
+
+
 def sort_by_bool_op(iterable, operator):
     """
     >>> packets = [
@@ -116,6 +268,105 @@ def sort_by_bool_op(iterable, operator):
     return lesser + [pivot] + greater
 
 
+def compare_packets(packet1, packet2) -> int:
+    """
+    Three-way version of correct_order for functools.cmp_to_key.
+
+    >>> compare_packets([1], [2]), compare_packets([2], [1]), compare_packets([1], [[1]])
+    (-1, 1, 0)
+    """
+    if isinstance(packet1, array):
+        res = correct_order_tokens(packet1, packet2)
+    else:
+        res = correct_order(packet1, packet2)
+    if res is None:
+        return 0
+    return -1 if res else 1
+
+
+packet_key = functools.cmp_to_key(compare_packets)
+
+
+def sort_packets(packets) -> list:
+    """
+    Sort nested lists or token arrays with the built-in sort.
+
+    >>> sort_packets([[9], [[8, 7, 6]], [], [[2]], [1, 1, 3]])
+    [[], [1, 1, 3], [[2]], [[8, 7, 6]], [9]]
+    """
+    return sorted(packets, key=packet_key)
+
+
+def divider_ranks(packets, dividers=([[2]], [[6]])) -> list:
+    """
+    1-based positions the dividers would have if they were sorted together
+    with the packets, found by counting instead of sorting. Packets that
+    tie with a divider are placed after it. Dividers are nested lists, and
+    are tokenized to match any packets given as token arrays.
+
+    >>> packets = [
+    ...     [1,1,3,1,1], [1,1,5,1,1], [[1],[2,3,4]], [[1],4], [9], [[8,7,6]],
+    ...     [[4,4],4,4], [[4,4],4,4,4], [7,7,7,7], [7,7,7], [], [3],
+    ...     [[[]]], [[]], [1,[2,[3,[4,[5,6,7]]]],8,9], [1,[2,[3,[4,[5,6,0]]]],8,9],
+    ... ]
+    >>> divider_ranks(packets)
+    [10, 14]
+    >>> divider_ranks([tokenize_packet(json.dumps(pp)) for pp in packets])
+    [10, 14]
+    """
+    ranks = [1] * len(dividers)
+    divider_tokens = [tokenize_packet(json.dumps(dd)) for dd in dividers]
+    for packet in packets:
+        if isinstance(packet, array):
+            targets = divider_tokens
+        else:
+            targets = dividers
+        for ii, divider in enumerate(targets):
+            if compare_packets(packet, divider) < 0:
+                ranks[ii] += 1
+    for ii, divider in enumerate(dividers):
+        for other in dividers:
+            if compare_packets(other, divider) < 0:
+                ranks[ii] += 1
+    return ranks
+
+
+def random_packet(rng: random.Random, depth: int=4, width: int=5) -> list:
+    packet = []
+    for _ in range(rng.randint(0, width)):
+        if depth and rng.random() < 0.3:
+            packet.append(random_packet(rng, depth - 1, width))
+        else:
+            packet.append(rng.randint(0, 10))
+    return packet
+
+
+def benchmark_parsers(n_packets: int=10000, depth: int=4, repeat: int=3) -> dict:
+    """
+    Best time in seconds to parse n_packets lines with each parser.
+
+    >>> times = benchmark_parsers(n_packets=20, repeat=1)
+    >>> sorted(times)
+    ['eval', 'json.loads', 'parse_packet', 'tokenize_packet']
+    """
+    rng = random.Random(0)
+    lines = [
+        json.dumps(random_packet(rng, depth), separators=(',', ':'))
+        for _ in range(n_packets)
+    ]
+    parsers = {
+        'eval': eval, 'json.loads': json.loads,
+        'parse_packet': parse_packet, 'tokenize_packet': tokenize_packet,
+    }
+    assert [parse_packet(ll) for ll in lines] == [json.loads(ll) for ll in lines]
+    return {
+        name: min(timeit.repeat(
+            lambda: [parser(ll) for ll in lines], number=1, repeat=repeat
+        ))
+        for name, parser in parsers.items()
+    }
+
+
 if __name__ == '__main__':
     import doctest
     doctest.testmod()
@@ -131,12 +382,8 @@ if __name__ == '__main__':
     print(total)
 
     # Part 2
-    all_packets = [[[2]], [[6]]]
+    all_packets = []
     for pair in parse_packets(lines):
         all_packets.extend(pair)
-    all_packets = sort_by_bool_op(all_packets, correct_order)
-    product = 1
-    for jj, packet in enumerate(all_packets, 1):
-        if packet == [[2]] or packet == [[6]]:
-            product *= jj
-    print(product)
+    rank2, rank6 = divider_ranks(all_packets)
+    print(rank2 * rank6)
@@ -1,5 +1,7 @@
 """https://adventofcode.com/2022/day/14"""
 
+import random
+import timeit
 from typing import Dict, Tuple, Set
 
 
@@ -65,8 +67,13 @@ def flow_sand(
     rock_coords: Set[Tuple],
     add_floor=False,
     origin: Tuple=(500, 0),
+    resume_path=False,
 ) -> Dict[Tuple, str]:
     """
+    With resume_path, the previous grain's fall is kept as a stack and the
+    next grain starts from the last point on it that is still open, since
+    its fall would be the same until there.
+
     >>> rocks = parse_rock_path('498,4 -> 498,6 -> 496,6')
     >>> rocks.update(parse_rock_path('503,4 -> 502,4 -> 502,9 -> 494,9'))
     >>> res = flow_sand(rocks)
@@ -75,6 +82,10 @@ def flow_sand(
     >>> res2 = flow_sand(rocks, add_floor=True)
     >>> sum(val == SAND for val in res2.values())
     93
+    >>> flow_sand(rocks, resume_path=True) == res
+    True
+    >>> flow_sand(rocks, add_floor=True, resume_path=True) == res2
+    True
     """
     origin = tuple(origin)
     contents = dict.fromkeys(rock_coords, ROCK)
@@ -86,6 +97,9 @@ def flow_sand(
         for floor_x in range(origin[0] - floor_y, origin[0] + floor_y + 1):
             contents[(floor_x, floor_y)] = ROCK
         bottom = floor_y
+    if resume_path:
+        _pour_resuming(contents, bottom, origin)
+        return contents
     still_piling = True
     while still_piling:
         grain = origin
@@ -116,6 +130,236 @@ def flow_sand(
     return contents
 
 
+def _pour_resuming(contents: Dict[Tuple, str], bottom: int, origin: Tuple):
+    """flow_sand's loop for resume_path, with the fall kept as a stack"""
+    path = [origin]
+    # The stack empties once sand rests on the origin
+    while path:
+        grain = path[-1]
+        while True:
+            # Stop if falling off the map
+            if grain[1] >= bottom:
+                return
+            below = (grain[0], grain[1] + 1)
+            if below not in contents:
+                grain = below
+                path.append(grain)
+                continue
+            bottom_left = (grain[0] - 1, grain[1] + 1)
+            if bottom_left not in contents:
+                grain = bottom_left
+                path.append(grain)
+                continue
+            bottom_right = (grain[0] + 1, grain[1] + 1)
+            if bottom_right not in contents:
+                grain = bottom_right
+                path.append(grain)
+                continue
+            # If cannot fall anymore, stops where it is
+            contents[grain] = SAND
+            path.pop()
+            break
+
+
+# Cell values for bytearray grids, where 0 is open space
+GRID_ROCK = 1
+GRID_SAND = 2
+
+
+def _grid_frame(min_x, max_x, max_y, add_floor, origin):
+    """(left, width, bottom) of a grid just covering where sand can go"""
+    origin_x = origin[0]
+    bottom = max_y
+    if add_floor:
+        bottom += 2
+        left = min(min_x, origin_x - bottom)
+        right = max(max_x, origin_x + bottom)
+    else:
+        # One spare column each side, down which grains fall off the map
+        left = min(min_x, origin_x) - 1
+        right = max(max_x, origin_x) + 1
+    return left, right - left + 1, bottom
+
+
+def _pour_grid(grid: bytearray, left: int, width: int, bottom: int, origin) -> int:
+    origin_x, origin_y = origin
+    start = origin_y * width + origin_x - left
+    n_grains = 0
+    while True:
+        pos = start
+        for _ in range(origin_y, bottom):
+            below = pos + width
+            if not grid[below]:
+                pos = below
+            elif not grid[below - 1]:
+                pos = below - 1
+            elif not grid[below + 1]:
+                pos = below + 1
+            else:
+                break
+        else:
+            # Fell off the map
+            return n_grains
+        grid[pos] = GRID_SAND
+        n_grains += 1
+        if pos == start:
+            return n_grains
+
+
+def flow_sand_grid(
+    rock_coords: Set[Tuple],
+    add_floor=False,
+    origin: Tuple=(500, 0),
+) -> int:
+    """
+    Number of grains that come to rest, on a flat bytearray grid that just
+    covers the area the sand can reach.
+
+    >>> rocks = parse_rock_path('498,4 -> 498,6 -> 496,6')
+    >>> rocks.update(parse_rock_path('503,4 -> 502,4 -> 502,9 -> 494,9'))
+    >>> flow_sand_grid(rocks), flow_sand_grid(rocks, add_floor=True)
+    (24, 93)
+    """
+    xs = [x for x, y in rock_coords]
+    max_y = max(y for x, y in rock_coords)
+    left, width, bottom = _grid_frame(min(xs), max(xs), max_y, add_floor, origin)
+    grid = bytearray(width * (bottom + 1))
+    for x, y in rock_coords:
+        grid[y * width + x - left] = GRID_ROCK
+    if add_floor:
+        grid[bottom * width:] = bytes([GRID_ROCK]) * width
+    return _pour_grid(grid, left, width, bottom, origin)
+
+
+def rasterize_rock_paths(lines, add_floor=False, origin: Tuple=(500, 0)):
+    """
+    Draw every rock path straight into a grid, one slice per segment.
+    Returns (grid, left, width, bottom) as used by flow_sand_grid.
+
+    >>> grid, left, width, bottom = rasterize_rock_paths(['498,4 -> 498,6 -> 496,6'])
+    >>> left, width, bottom
+    (495, 7, 6)
+    >>> for y in range(4, 7):
+    ...     print(''.join(' #'[cell] for cell in grid[y * width:(y + 1) * width]) + '|')
+       #   |
+       #   |
+     ###   |
+    """
+    if isinstance(lines, str):
+        lines = lines.splitlines()
+    paths = []
+    for line in lines:
+        line = line.strip()
+        if line:
+            paths.append([int(nn) for nn in line.replace(' -> ', ',').split(',')])
+    min_x = min(min(path[0::2]) for path in paths)
+    max_x = max(max(path[0::2]) for path in paths)
+    max_y = max(max(path[1::2]) for path in paths)
+    left, width, bottom = _grid_frame(min_x, max_x, max_y, add_floor, origin)
+    grid = bytearray(width * (bottom + 1))
+    for path in paths:
+        x1, y1 = path[0], path[1]
+        grid[y1 * width + x1 - left] = GRID_ROCK
+        for jj in range(2, len(path), 2):
+            x2, y2 = path[jj], path[jj + 1]
+            if y1 == y2:
+                lo, hi = min(x1, x2), max(x1, x2)
+                row = y1 * width - left
+                grid[row + lo:row + hi + 1] = bytes([GRID_ROCK]) * (hi - lo + 1)
+            elif x1 == x2:
+                lo, hi = min(y1, y2), max(y1, y2)
+                column = x1 - left
+                cells = slice(lo * width + column, hi * width + column + 1, width)
+                grid[cells] = bytes([GRID_ROCK]) * (hi - lo + 1)
+            x1, y1 = x2, y2
+    if add_floor:
+        grid[bottom * width:] = bytes([GRID_ROCK]) * width
+    return grid, left, width, bottom
+
+
+def flow_sand_paths(lines, add_floor=False, origin: Tuple=(500, 0)) -> int:
+    """
+    >>> scan = ['498,4 -> 498,6 -> 496,6', '503,4 -> 502,4 -> 502,9 -> 494,9']
+    >>> flow_sand_paths(scan), flow_sand_paths(scan, add_floor=True)
+    (24, 93)
+    """
+    grid, left, width, bottom = rasterize_rock_paths(lines, add_floor, origin)
+    return _pour_grid(grid, left, width, bottom, origin)
+
+
+def floor_sand_count(rock_coords: Set[Tuple], origin: Tuple=(500, 0)) -> int:
+    """
+    Grains that settle with the floor added, without dropping any. With a
+    floor, sand ends up in exactly the open cells reachable from the origin
+    by moving down, down-left or down-right, so each row of sand is the
+    row above spread one cell each way, minus rock. Rows are bitsets.
+
+    >>> rocks = parse_rock_path('498,4 -> 498,6 -> 496,6')
+    >>> rocks.update(parse_rock_path('503,4 -> 502,4 -> 502,9 -> 494,9'))
+    >>> floor_sand_count(rocks)
+    93
+    """
+    origin_x, origin_y = origin
+    floor_y = max(y for x, y in rock_coords) + 2
+    depth = floor_y - origin_y
+    left = origin_x - depth
+    full = (1 << (2 * depth + 1)) - 1
+    # {<y: int>: <rock bits: int>} within the reachable triangle
+    rock_rows = dict()
+    for x, y in rock_coords:
+        if origin_y <= y < floor_y and 0 <= x - left <= 2 * depth:
+            rock_rows[y] = rock_rows.get(y, 0) | (1 << (x - left))
+    row = (1 << (origin_x - left)) & ~rock_rows.get(origin_y, 0)
+    n_grains = row.bit_count()
+    for y in range(origin_y + 1, floor_y):
+        if not row:
+            break
+        row = (row | (row << 1) | (row >> 1)) & full & ~rock_rows.get(y, 0)
+        n_grains += row.bit_count()
+    return n_grains
+
+
+def synthetic_cave(depth: int=200, n_paths: int=None, seed: int=0) -> Set[Tuple]:
+    """Rock coordinates of random short walls below (500, 0)"""
+    rng = random.Random(seed)
+    if n_paths is None:
+        n_paths = depth // 2
+    rocks = set()
+    for _ in range(n_paths):
+        x = rng.randint(500 - depth // 2, 500 + depth // 2)
+        y = rng.randint(2, depth)
+        joints = [(x, y)]
+        for _ in range(rng.randint(1, 3)):
+            if rng.random() < 0.5:
+                x += rng.randint(-10, 10)
+            else:
+                y = min(depth, max(2, y + rng.randint(-6, 6)))
+            joints.append((x, y))
+        rocks.update(parse_rock_path(' -> '.join(f'{x},{y}' for x, y in joints)))
+    return rocks
+
+
+def benchmark_flow_sand(depth: int=200, add_floor=True, repeat: int=3) -> dict:
+    """
+    Best time in seconds of flow_sand with and without resume_path.
+
+    >>> times = benchmark_flow_sand(depth=10, repeat=1)
+    >>> sorted(times)
+    ['from_origin', 'resume_path']
+    """
+    rocks = synthetic_cave(depth)
+    assert flow_sand(rocks, add_floor) == flow_sand(rocks, add_floor, resume_path=True)
+    return {
+        'from_origin': min(timeit.repeat(
+            lambda: flow_sand(rocks, add_floor), number=1, repeat=repeat
+        )),
+        'resume_path': min(timeit.repeat(
+            lambda: flow_sand(rocks, add_floor, resume_path=True),
+            number=1, repeat=repeat,
+        )),
+    }
+
+
 if __name__ == '__main__':
     import doctest
     doctest.testmod()
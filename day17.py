@@ -200,6 +200,125 @@ class CaveIn:
             self.drop_rock()
 
 
+# Each shape as row masks from the bottom up, with bit x for column x
+SHAPE_MASKS = [
+    (0b1111,),
+    (0b010, 0b111, 0b010),
+    (0b111, 0b100, 0b100),
+    (0b1, 0b1, 0b1, 0b1),
+    (0b11, 0b11),
+]
+
+
+class BitCave:
+    """
+    CaveIn with each row of settled rock as a bitmask in a bytearray, so
+    collisions and wind pushes are AND and shift operations.
+
+    >>> winds = '>>><<><>><<<>><>>><<<>>><<<><<<>><>><<>>'
+    >>> cave = BitCave(winds, 7)
+    >>> for _ in range(2022): cave.drop_rock()
+    >>> cave.top_height + 1
+    3068
+    >>> cave2 = BitCave(winds, 7)
+    >>> cave2.drop_rock_loop(2022)
+    >>> cave2.top_height + 1
+    3068
+    >>> cave3 = BitCave(winds, 7)
+    >>> cave3.drop_rock_loop(1000000000000)
+    >>> cave3.top_height + 1
+    1514285714288
+    """
+    def __init__(self, wind: str, cave_width: int=7) -> None:
+        if not 0 < cave_width <= 8:
+            raise ValueError('BitCave rows hold at most 8 columns')
+        self.wind = wind
+        self.cave_width = int(cave_width)
+        self._full_row = (1 << self.cave_width) - 1
+        self._right_wall = 1 << (self.cave_width - 1)
+        self.rows = bytearray()
+        self.top_height = -1
+        self.n_fallen = 0
+        self._wind_index = 0
+        self._shape_index = 0
+        # Height added by skipping repeated cycles, not present in rows
+        self._skipped_height = 0
+        # (row masks packed a byte per row, rows, left wall, right wall),
+        # with each shape starting two columns from the left
+        self._shapes = []
+        for masks in SHAPE_MASKS:
+            packed = sum((mm << 2) << (8 * ii) for ii, mm in enumerate(masks))
+            left_wall = int.from_bytes(bytes([1] * len(masks)), 'little')
+            right_wall = left_wall * self._right_wall
+            self._shapes.append((packed, len(masks), left_wall, right_wall))
+
+    def _collides(self, packed: int, y: int) -> bool:
+        return bool(int.from_bytes(self.rows[y:y + 4], 'little') & packed)
+
+    def drop_rock(self):
+        packed, n_rows, left_wall, right_wall = self._shapes[self._shape_index]
+        self._shape_index = (self._shape_index + 1) % len(self._shapes)
+        y = len(self.rows) + 3
+        while True:
+            wind_char = self.wind[self._wind_index]
+            self._wind_index = (self._wind_index + 1) % len(self.wind)
+            if wind_char == '<':
+                if not packed & left_wall and not self._collides(packed >> 1, y):
+                    packed >>= 1
+            elif not packed & right_wall and not self._collides(packed << 1, y):
+                packed <<= 1
+            if y > 0 and not self._collides(packed, y - 1):
+                y -= 1
+            else:
+                break
+        needed = y + n_rows - len(self.rows)
+        if needed > 0:
+            self.rows.extend(bytes(needed))
+        for ii in range(n_rows):
+            self.rows[y + ii] |= (packed >> (8 * ii)) & 0xFF
+        self.n_fallen += 1
+        self.top_height = len(self.rows) - 1 + self._skipped_height
+
+    def settled_top_layer(self) -> tuple:
+        """
+        Settled rows that falling rock could still touch, as
+        (depth below the top, mask) pairs. Same flood as CaveIn's.
+        """
+        reach = self._full_row
+        surface = []
+        for y in range(len(self.rows) - 1, -2, -1):
+            solid = self.rows[y] if y >= 0 else self._full_row
+            above = self.rows[y + 1] if y + 1 < len(self.rows) else 0
+            spread = (reach >> 1) | (reach << 1)
+            touched = (reach | (spread & ~above)) & self._full_row
+            if touched & solid:
+                surface.append((len(self.rows) - 1 - y, touched & solid))
+            reach = touched & ~solid
+            if not reach:
+                break
+        return tuple(surface)
+
+    def drop_rock_loop(self, n_rocks: int):
+        # {(shape, wind, top layer): (rocks dropped, top_height)}
+        seen = dict()
+        dropped = 0
+        while dropped < n_rocks:
+            key = (self._shape_index, self._wind_index, self.settled_top_layer())
+            if key in seen:
+                then_dropped, then_height = seen[key]
+                period = dropped - then_dropped
+                repeats = (n_rocks - dropped) // period
+                self._skipped_height += repeats * (self.top_height - then_height)
+                self.top_height += repeats * (self.top_height - then_height)
+                dropped += repeats * period
+                break
+            seen[key] = (dropped, self.top_height)
+            self.drop_rock()
+            dropped += 1
+        for _ in range(n_rocks - dropped):
+            self.drop_rock()
+
+
 if __name__ == '__main__':
     import doctest
     doctest.testmod()